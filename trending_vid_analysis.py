@@ -40,13 +40,12 @@
 #%% [markdown]
 # ### Standard imports.
 #%%
+import os
 import pandas as pd 
 import numpy as np 
 import matplotlib.pyplot as plt
 from plotly.offline import iplot, init_notebook_mode
 import plotly.graph_objs as go
-from datetime import datetime
-import dateutil.parser
 import seaborn as sns 
 sns.set_style('whitegrid')
 init_notebook_mode(connected=True)
@@ -54,23 +53,80 @@ init_notebook_mode(connected=True)
 
 
 #%%
-def load_data(path):
-    return pd.read_csv(path)
+# Column types for USvideos.csv, passed to read_csv to skip type inference.
+column_dtypes = {
+    'video_id' : 'string',
+    'channel_title' : 'category',
+    'category_id' : 'int8',
+    'views' : 'int64',
+    'likes' : 'int32',
+    'dislikes' : 'int32',
+    'comment_count' : 'int32',
+    'comments_disabled' : 'bool',
+    'ratings_disabled' : 'bool',
+    'video_error_or_removed' : 'bool',
+}
+
+# Column types the parquet cache must come back with, a cache written
+# by older load logic doesn't match and gets rebuilt from the csv.
+cached_dtypes = {**column_dtypes, 'publish_time' : 'datetime64', 'trending_date' : 'datetime64'}
 
-# Convert timestamp strings to datetime object.
-def convert_date(timestamp, date_format='%Y-%m-%d'):
+def load_data(path, cols=None, chunksize=10_000):
     '''
-    Converts timestamp to datetime object with specified format.
-    default format: '%Y-%m-%d'
+    Loads csv into dataframe with pre-specified column types.
+    The csv is read in chunks of rows to bound parser memory,
+    publish_time and trending_date are parsed to datetimes.
+    The full table is cached next to the csv as parquet, later calls
+    read the cache instead of re-parsing the csv as long as it is newer
+    than the csv and its column types match cached_dtypes.
+    Accepts path: Path to csv file.
+            cols: List of columns to load. (default=None, all columns)
+            chunksize: Number of csv rows parsed per chunk. (default=10_000)
     '''
-    if 'Z' not in timestamp: # trending_date has format 'yy.dd.mm'
-        parsed_date = datetime.strptime(timestamp, '%y.%d.%m')
-        return parsed_date
-    else:               # publish_time has format 'yyyy-mm-ddThh:mm:ss.000Z'
-        d = dateutil.parser.parse(timestamp)
-        parsed_date = d.strftime('%Y-%m-%d')
-        return d.strptime(parsed_date, date_format)
-
+    pq_path = os.path.splitext(path)[0] + '.parquet'
+    if os.path.exists(pq_path) and os.path.getmtime(pq_path) >= os.path.getmtime(path):
+        try:
+            df = pd.read_parquet(pq_path, columns=cols)
+        except (OSError, ValueError, ImportError):
+            df = None # Unreadable cache or no parquet engine, fall back to the csv.
+        if df is not None and all(str(df[col].dtype).startswith(dtype)
+                                  for col, dtype in cached_dtypes.items() if col in df):
+            return df
+
+    # Each chunk infers its own categories, so categorical columns are kept as
+    # codes into one shared label list while reading and rebuilt after concat.
+    category_cols = [col for col, dtype in column_dtypes.items() if dtype == 'category']
+    label_codes = {col: {} for col in category_cols}
+    chunks = []
+    for chunk in pd.read_csv(path, dtype=column_dtypes, parse_dates=['publish_time'],
+                             chunksize=chunksize):
+        for col in category_cols:
+            known = label_codes[col]
+            chunk_labels = chunk[col].cat.categories
+            # Trailing -1 maps missing values (code -1) to -1.
+            remap = np.array([known.setdefault(label, len(known)) for label in chunk_labels] + [-1],
+                             dtype='int32')
+            chunk[col] = remap[chunk[col].cat.codes.to_numpy()]
+        # trending_date has format 'yy.dd.mm', which parse_dates can't infer.
+        chunk['trending_date'] = pd.to_datetime(chunk['trending_date'], format='%y.%d.%m', cache=True)
+        chunks.append(chunk)
+    df = pd.concat(chunks, ignore_index=True)
+    del chunks
+
+    for col in category_cols:
+        labels = pd.Categorical.from_codes(df[col].to_numpy(), categories=list(label_codes[col]))
+        df[col] = labels.reorder_categories(sorted(label_codes[col]))
+    # Write to a temporary file first so a failed write never leaves a
+    # truncated cache in place.
+    tmp_path = os.path.splitext(path)[0] + '.tmp.parquet'
+    try:
+        df.to_parquet(tmp_path, compression='zstd')
+        os.replace(tmp_path, pq_path)
+    except (OSError, ImportError):
+        # The cache is optional, e.g. no parquet engine or a read-only data directory.
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return df if cols is None else df[cols]
 
 # Map category labels, add category_label column.
 def map_categories(df, map_dict, column='category_label'):
@@ -80,33 +136,53 @@ def map_categories(df, map_dict, column='category_label'):
             column: Column name in df to perform map on. (default='category_label')
             map_dict: Dictionary containing map items. (default=category_dict)
     '''
-    df[column] = df.category_id.map(map_dict)
+    # Index category ids straight into a code lookup instead of hashing each row.
+    categories = list(dict.fromkeys(map_dict.values()))
+    lookup = np.full(max(map_dict) + 1, -1, dtype='int8')
+    for cat_id, label in map_dict.items():
+        lookup[cat_id] = categories.index(label)
+
+    # Ids outside the lookup keep code -1 and come out as NaN, like a missed map.
+    ids = df.category_id.to_numpy()
+    known = (ids >= 0) & (ids < len(lookup))
+    codes = np.full(len(ids), -1, dtype='int8')
+    codes[known] = lookup[ids[known]]
+
+    labels = pd.Categorical.from_codes(codes, categories=categories)
+    df[column] = labels.remove_unused_categories()
     return df
 
+# Slice rows for a single year out of the year groups.
+def slice_for_yr(by_year, year):
+    '''
+    Returns the rows for specified year, or an empty dataframe
+    if no videos were published that year.
+    Accepts by_year: Dataframe grouped by year.
+            year: Year to slice.
+    '''
+    if year in by_year.indices:
+        return by_year.get_group(year)
+    return by_year.head(0)
+
 # Find top youTube video producers for specified year.
-def top_video_producing_for_yr(df, year, top_range=5):
+def top_video_producing_for_yr(by_year, year, top_range=5):
     '''
     Finds top video producers for specified year.
-    Accepts df: Dataframe.
-            year: Year to filter by.
+    Accepts by_year: Dataframe grouped by year. (e.g. by_year)
+            year: Year to filter by, a year without videos gives an empty report.
             top_range: Number of top entries to print / return. (default=5)
     '''
 
-    year_filter = [date.year == year for date in df['publish_time']]
-    sliced_df = df[year_filter]
+    sliced_df = slice_for_yr(by_year, year)
 
-    channel_vid_groups = sliced_df.groupby(['channel_title'])['video_id'].count()
-    sorted_groups = channel_vid_groups.sort_values(ascending=False)
-    top_producers = sorted_groups[:top_range]
+    channel_vid_counts = sliced_df['channel_title'].cat.remove_unused_categories().value_counts()
+    top_producers = channel_vid_counts[:top_range]
 
     print('#'*30)
     print(f'Top {top_range} video producers in {year} were:')
     print()
-    i = 0
-    for vid_count in top_producers:
-        print('\t', f'{str(i+1)}) {top_producers.index[i]} : {vid_count} videos.', end='')
-        print('\n')
-        i += 1
+    print('\n'.join(f'\t {n}) {name} : {vid_count} videos.\n'
+                    for n, (name, vid_count) in enumerate(top_producers.items(), 1)))
 
     print('#'*30)
 
@@ -128,11 +204,10 @@ def plotly_bar(x, y, name, title, x_title, y_title, filename, colors=None):
     iplot(fig, filename=filename)
 
 # Plotly Bar graph for year
-def plot_category_bar_for_yr(df, year, colors=None):
-    year_filter = [date.year == year for date in df['publish_time']]
-    sliced_df = df[year_filter]
+def plot_category_bar_for_yr(by_year, year, colors=None):
+    sliced_df = slice_for_yr(by_year, year)
 
-    category_counts_for_yr = sliced_df.category_label.value_counts()
+    category_counts_for_yr = sliced_df.category_label.cat.remove_unused_categories().value_counts()
     print(category_counts_for_yr)
 
     x = category_counts_for_yr.index
@@ -149,13 +224,11 @@ def plot_category_bar_for_yr(df, year, colors=None):
 #%% [markdown]
 # ### Load Dataset
 #%%
-df = load_data('data/USvideos.csv')
-
-#%%
-date_columns = ['trending_date', 'publish_time']
-
-for col in date_columns:
-    df[col] = [convert_date(ts) for ts in df[col]]
+# description, tags and thumbnail_link are never used in the analysis, leave them out.
+analysis_columns = ['video_id', 'trending_date', 'title', 'channel_title', 'category_id',
+                    'publish_time', 'views', 'likes', 'dislikes', 'comment_count',
+                    'comments_disabled', 'ratings_disabled', 'video_error_or_removed']
+df = load_data('data/USvideos.csv', cols=analysis_columns)
 
 #%%
 # Take a peak at the first 5 rows (head).
@@ -166,7 +239,7 @@ df.head()
 df.info()
 
 # 40,949 total entries.
-# Every column looks complete with the exception of the video descriptions.
+# Every column looks complete (the video descriptions, which have gaps, are not loaded).
 
 #%%
 # Take a peak at the dataframes describe function.
@@ -224,15 +297,17 @@ category_dict = {
 #%%
 # Store new dataframe in a new variable.
 mapped_df = map_categories(df, map_dict=category_dict)
-year_list = [int(date.year) for date in mapped_df['publish_time']]
-mapped_df['year'] = year_list
+mapped_df['year'] = mapped_df['publish_time'].dt.year.astype('int16')
 
 # Rearrange columns so that category_id 
 # and category_label are next to one another.
 mapped_df = mapped_df[['video_id', 'trending_date', 'title', 'channel_title', 'category_id',
-                    'category_label', 'publish_time', 'tags', 'views', 'likes', 'dislikes', 
-                    'comment_count', 'thumbnail_link', 'comments_disabled', 'ratings_disabled',
-                    'video_error_or_removed', 'description', 'year']]
+                    'category_label', 'publish_time', 'views', 'likes', 'dislikes', 
+                    'comment_count', 'comments_disabled', 'ratings_disabled',
+                    'video_error_or_removed', 'year']]
+
+# Group by year once, per-year slices are then looked up instead of re-filtered.
+by_year = mapped_df.groupby('year', sort=False)
 
 
 #%%
@@ -246,11 +321,10 @@ cat_colors = ['#016e29', '#7f2171', '#b241d0', '#decad2', '#54d7a1', '#10e481',
 cat_colors_dict = {cat:color for cat, color in zip(category_list, cat_colors)}
 
 #%%
-i = 0
-for count in category_counts:
-    print(f'Of the {mapped_df.shape[0]} videos uploaded, {count} ({(count/mapped_df.shape[0]) * 100:0.2f}%) videos were of the {category_counts.index[i]} category.')
-    print()
-    i += 1
+total = len(mapped_df)
+category_stats = pd.DataFrame({'count': category_counts, 'pct': category_counts * 100 / total})
+print(f'Of the {total} videos uploaded:')
+print(category_stats.to_string(float_format='%.2f'))
 
 #%%
 # PLot bar chart for all years.
@@ -267,22 +341,23 @@ plotly_bar(x, y, name, title, x_title, y_title, filename, colors=colors)
 
 #%%
 # PLot bar chart for 2018.
-plot_category_bar_for_yr(mapped_df, 2018, colors=cat_colors)
+plot_category_bar_for_yr(by_year, 2018, colors=cat_colors)
 
 #%%
 # PLot bar chart for 2018.
-plot_category_bar_for_yr(mapped_df, 2017, colors=cat_colors)
+plot_category_bar_for_yr(by_year, 2017, colors=cat_colors)
 
 #%%
 # Table of year and category labels. Here we see the general number of videos
 # (That are tracked) uploaded since 2006.
-grouped_df = mapped_df.groupby(['category_label', 'year'])['video_id'].count()
-unstacked_df = grouped_df.unstack().fillna(value=0)
-unstacked_df
+category_year_df = pd.crosstab(mapped_df['category_label'], mapped_df['year'])
+# Sort rows by label name, not by category code order.
+category_year_df = category_year_df.sort_index(key=lambda labels: labels.astype(str))
+category_year_df
 
 
 #%%
-channel_groups = mapped_df.groupby(['channel_title'])['video_id'].count().sort_values(ascending=False)
+channel_groups = mapped_df['channel_title'].value_counts()
 channel_groups[:30]
 
 #%%
@@ -300,20 +375,24 @@ plotly_bar(x=channel_groups.index[:end],
             x_title=x_title, 
             y_title=y_title, 
             filename=filename)
+#%%
+# Index by channel so per-channel lookups don't scan every row.
+channel_indexed = mapped_df.set_index('channel_title', drop=False).sort_index()
+
 #%%
 # Top category for ESPN channel.
-top_channel_df = mapped_df[mapped_df['channel_title'] == 'ESPN']
-top_channel_df.groupby(['category_label'])['video_id'].count().sort_values(ascending=False)
+top_channel_df = channel_indexed.loc['ESPN':'ESPN']
+top_channel_df['category_label'].cat.remove_unused_categories().value_counts()
 
 #%%
 # Top category for The Tonight Show.
 channel = 'The Tonight Show Starring Jimmy Fallon'
-top_channel_df = mapped_df[mapped_df['channel_title'] == channel]
-top_channel_df.groupby(['category_label'])['video_id'].count().sort_values(ascending=False)
+top_channel_df = channel_indexed.loc[channel:channel]
+top_channel_df['category_label'].cat.remove_unused_categories().value_counts()
 
 #%%
 # Report out categories and the amount of view accrued from 2006 - 2018.
-view_counts = mapped_df.groupby(['category_label'])['views'].sum().sort_values(ascending=False)
+view_counts = mapped_df.groupby(['category_label'], observed=True, sort=False)['views'].sum().sort_values(ascending=False)
 
 i = 0
 for count in view_counts:
@@ -326,8 +405,8 @@ print(view_counts)
 
 #%%
 # Report out categories and the amount of view accrued in 2017.
-df_2017 = mapped_df[mapped_df['year'] == 2017]
-view_counts_2017 = df_2017.groupby(['category_label'])['views'].sum().sort_values(ascending=False)
+df_2017 = slice_for_yr(by_year, 2017)
+view_counts_2017 = df_2017.groupby(['category_label'], observed=True, sort=False)['views'].sum().sort_values(ascending=False)
 
 i = 0
 for count in view_counts_2017:
@@ -342,8 +421,8 @@ print('#'*35)
 
 #%%
 # Report out categories and the amount of view accrued in 2018.
-df_2018 = mapped_df[mapped_df['year'] == 2018]
-view_counts_2018 = df_2018.groupby(['category_label'])['views'].sum().sort_values(ascending=False)
+df_2018 = slice_for_yr(by_year, 2018)
+view_counts_2018 = df_2018.groupby(['category_label'], observed=True, sort=False)['views'].sum().sort_values(ascending=False)
 
 i = 0
 for count in view_counts_2018: